@@ -8,13 +8,36 @@ import os
 import time
 import json
 import logging
-import psycopg2
-from psycopg2.extras import Json
-from psycopg2 import sql
+from operator import itemgetter
+from functools import partial
+from math import isfinite
+from concurrent.futures import ThreadPoolExecutor
+import psycopg
+from psycopg_pool import ConnectionPool
 from datetime import datetime, timezone
 import pika
 from pika.exceptions import AMQPConnectionError
 
+# orjson parsea ~3x más rápido que la librería estándar y acepta bytes
+# directamente (sin .decode()). Si no está instalado, caemos a json.
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# pysimdjson (parseo SIMD) gana incluso a orjson. El Parser se reutiliza
+# entre mensajes y su buffer interno se pisa en cada parse(), por eso
+# exportamos a dict: la fila queda encolada hasta el flush del lote.
+try:
+    import simdjson
+    _parser = simdjson.Parser()
+
+    def _parse(body):
+        return _parser.parse(body).as_dict()
+except ImportError:
+    _parse = _loads
+
 # ==================== Configuración ====================
 RABBIT_HOST = os.getenv("RABBITMQ_HOST", "localhost")
 RABBIT_USER = os.getenv("RABBITMQ_USER", "rabbit")
@@ -25,10 +48,64 @@ PG_DB = os.getenv("POSTGRES_DB", "weatherdb")
 PG_USER = os.getenv("POSTGRES_USER", "weather")
 PG_PASS = os.getenv("POSTGRES_PASSWORD", "weatherpass")
 
+# Socket UNIX cuando Postgres corre en la misma máquina: se salta la pila
+# TCP/IP (~30% menos por round-trip). Se usa PG_SOCKET_DIR si está definido,
+# o el directorio estándar si el host es local y el socket existe.
+PG_SOCKET_DIR = os.getenv("PG_SOCKET_DIR", "")
+
+# En la red interna de docker-compose no hay TLS que negociar: "disable"
+# ahorra ~2 RTT en cada conexión. Cambiar a "require" para Postgres remoto.
+PG_SSLMODE = os.getenv("PG_SSLMODE", "disable")
+
+def _pg_host():
+    """
+    Host efectivo para conectar a PostgreSQL: socket UNIX si es local
+    y está disponible, TCP en el resto de casos.
+    """
+    if PG_SOCKET_DIR:
+        return PG_SOCKET_DIR
+    if PG_HOST in ('localhost', '127.0.0.1') and os.path.isdir('/var/run/postgresql'):
+        return '/var/run/postgresql'
+    return PG_HOST
+
 EXCHANGE = "weather_exchange"
 QUEUE = "weather_queue"
 ROUTING_KEY = "weather.logs"
 
+# Prefetch: cuántos mensajes sin ACK puede tener este consumidor en vuelo.
+# Con 1 cada mensaje espera el round-trip del ACK antes de recibir el siguiente;
+# con ~100 el broker mantiene el pipe lleno mientras insertamos en BD.
+PREFETCH = int(os.getenv("PREFETCH_COUNT", "100"))
+
+# Cada cuántos mensajes se envía un ACK acumulado (multiple=True).
+# Un solo frame reconoce N mensajes, ahorrando CPU del broker y tráfico de red.
+ACK_BATCH = int(os.getenv("ACK_BATCH", "32"))
+
+# Tamaño del lote de INSERTs: N filas viajan en una sola sentencia y un solo
+# commit en vez de un round-trip + fsync por mensaje. Coordinado con PREFETCH
+# para que siempre haya mensajes en vuelo con los que llenar el lote.
+INSERT_BATCH = int(os.getenv("INSERT_BATCH", str(PREFETCH)))
+
+# Volcar lotes con COPY FROM STDIN en vez de INSERT: el protocolo COPY se
+# salta el parseo por fila en el servidor (~2-3x sobre INSERT en lote), a
+# cambio de algo más de latencia por lote. Solo interesa bajo carga sostenida.
+COPY_MODE = os.getenv("COPY_MODE", "0") == "1"
+
+# Modo multihilo opcional: N workers insertan en paralelo contra un pool de
+# conexiones, eliminando el cuello de botella de una sola conexión a BD.
+# 0 (por defecto) = desactivado; se usa el camino de lotes de arriba.
+DB_WORKERS = int(os.getenv("DB_WORKERS", "0"))
+
+# ==================== SQL precompilado ====================
+# Las sentencias se construyen una sola vez a nivel de módulo. Con el texto
+# siempre idéntico, psycopg3 las prepara automáticamente en el servidor a
+# partir de la quinta ejecución (prepare_threshold), sin PREPARE manual.
+INSERT_COLUMNS = ("station_id, timestamp, temperature_c, humidity_percent, "
+                  "wind_speed_ms, raw_payload, status")
+INSERT_SQL = (f"INSERT INTO weather_logs ({INSERT_COLUMNS}) "
+              "VALUES (%s, %s, %s, %s, %s, %s, %s)")
+COPY_SQL = f"COPY weather_logs ({INSERT_COLUMNS}) FROM STDIN"
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -44,21 +121,80 @@ def connect_db():
     """
     while True:
         try:
-            conn = psycopg2.connect(
-                host=PG_HOST,
+            conn = psycopg.connect(
+                host=_pg_host(),
                 dbname=PG_DB,
                 user=PG_USER,
                 password=PG_PASS,
+                sslmode=PG_SSLMODE,
                 connect_timeout=5
             )
-            conn.autocommit = True  # Confirmar cambios inmediatamente
+            # autocommit queda en False: commit explícito al cerrar cada lote.
+            # No hace falta PREPARE manual: psycopg3 prepara la sentencia en
+            # el servidor automáticamente tras unas pocas ejecuciones.
+
+            # Cursor de larga vida: crear y cerrar un cursor por mensaje es
+            # overhead Python puro, así que reutilizamos uno por conexión.
+            global _cursor
+            _cursor = conn.cursor()
+
             logger.info("✓ Conectado a PostgreSQL")
             return conn
-        except psycopg2.OperationalError as e:
+        except psycopg.OperationalError as e:
             logger.error(f"✗ Error conectando a PostgreSQL: {e}")
             logger.info("  Reintentando en 3 segundos...")
             time.sleep(3)
 
+def recover_db_conn(db_conn):
+    """
+    Comprueba si la conexión sigue usable tras un error transitorio
+    (rollback + SELECT 1), para ahorrarse el handshake TCP + auth de una
+    reconexión completa. Si la conexión está rota, devuelve False y el
+    loop principal reconecta.
+
+    Args:
+        db_conn: conexión a PostgreSQL
+
+    Retorna: True si la conexión quedó usable
+    """
+    global _cursor
+    if db_conn.closed or db_conn.broken:
+        return False
+    try:
+        db_conn.rollback()
+        _cursor = db_conn.cursor()
+        _cursor.execute("SELECT 1")
+        _cursor.fetchone()
+        db_conn.commit()
+        logger.info("✓ Conexión PostgreSQL recuperada")
+        return True
+    except Exception as e:
+        logger.error(f"✗ Recuperación de la conexión falló: {e}")
+        return False
+
+def schedule_db_ping(conn, db_conn):
+    """
+    Programa un SELECT 1 periódico (30s) para detectar conexiones muertas
+    antes de que llegue una ráfaga de mensajes, en vez de descubrirlo con
+    el primer INSERT fallido.
+
+    Args:
+        conn: conexión de RabbitMQ (BlockingConnection)
+        db_conn: conexión a PostgreSQL
+    """
+    def _ping():
+        try:
+            if db_conn.closed:
+                raise psycopg.InterfaceError("conexión cerrada")
+            _cursor.execute("SELECT 1")
+            _cursor.fetchone()
+            db_conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠ Ping a PostgreSQL falló: {e}")
+            recover_db_conn(db_conn)
+        conn.call_later(30.0, _ping)
+    conn.call_later(30.0, _ping)
+
 # ==================== Conexión a RabbitMQ ====================
 def connect_rabbitmq():
     """
@@ -99,15 +235,17 @@ def connect_rabbitmq():
                 routing_key=ROUTING_KEY
             )
             
-            # *** PREFETCH = 1 ***
-            # Cada consumidor recibe 1 mensaje a la vez y debe procesarlo completamente
-            # antes de recibir el siguiente. Esto garantiza procesamiento ordenado.
-            ch.basic_qos(prefetch_count=1)
-            
+            # *** PREFETCH configurable ***
+            # Con prefetch > 1 el servidor puede enviar varios mensajes sin esperar
+            # el ACK de cada uno, solapando entregas con el tiempo de inserción en BD.
+            # Se relaja la garantía de procesamiento estrictamente ordenado, pero
+            # cada mensaje se procesa de forma independiente, así que no afecta.
+            ch.basic_qos(prefetch_count=PREFETCH)
+
             logger.info("✓ Conectado a RabbitMQ")
             logger.info(f"  Exchange: {EXCHANGE} (durable)")
             logger.info(f"  Queue: {QUEUE} (durable)")
-            logger.info(f"  Prefetch: 1 (procesamiento secuencial)")
+            logger.info(f"  Prefetch: {PREFETCH}")
             
             return conn, ch
         except AMQPConnectionError as e:
@@ -115,104 +253,405 @@ def connect_rabbitmq():
             logger.info("  Reintentando en 5 segundos...")
             time.sleep(5)
 
+# ==================== ACKs en lote ====================
+# Estado del lote: último delivery_tag visto y cuántos mensajes lleva acumulados.
+# Un solo basic_ack con multiple=True reconoce todos los tags hasta el último.
+_pending_acks = 0
+_last_delivery_tag = 0
+
+def flush_acks(ch, db_conn):
+    """
+    Envía un ACK acumulado (multiple=True) por todos los mensajes pendientes.
+    Antes de reconocer, vuelca el lote de filas a BD: nunca se confirma al
+    broker un mensaje cuya fila no esté commiteada.
+
+    Args:
+        ch: canal de RabbitMQ
+        db_conn: conexión a PostgreSQL
+    """
+    global _pending_acks
+    if _pending_acks > 0:
+        if flush_rows(db_conn):
+            ch.basic_ack(delivery_tag=_last_delivery_tag, multiple=True)
+        else:
+            # Las filas no llegaron a BD: devolver los mensajes a la cola
+            # para que se reintenten, en vez de confirmarlos perdidos
+            ch.basic_nack(delivery_tag=_last_delivery_tag, multiple=True,
+                          requeue=True)
+        _pending_acks = 0
+
+def requeue_pending_window(ch, delivery_tag):
+    """
+    Devuelve a la cola toda la ventana pendiente (hasta delivery_tag
+    incluido) y descarta sus filas no commiteadas: el broker los
+    redeliverará tras la reconexión, sin pérdidas ni ACKs falsos.
+
+    Args:
+        ch: canal de RabbitMQ
+        delivery_tag: tag del mensaje actual (tope de la ventana)
+    """
+    ch.basic_nack(delivery_tag=delivery_tag, multiple=True, requeue=True)
+    reset_ack_state()
+
+def reset_ack_state():
+    """
+    Resetea la ventana de ACKs y las filas pendientes. Los delivery tags
+    son por canal: un canal nuevo no debe heredar el tag del anterior
+    (un ACK con un tag viejo mata el canal con 406 PRECONDITION_FAILED,
+    o confirma en falso mensajes redelivered aún sin procesar).
+    """
+    global _pending_acks, _last_delivery_tag
+    pending_rows.clear()
+    _pending_acks = 0
+    _last_delivery_tag = 0
+
+def ack_message(ch, db_conn, delivery_tag):
+    """
+    Registra un mensaje como procesado y envía el ACK en lote si toca.
+
+    Args:
+        ch: canal de RabbitMQ
+        db_conn: conexión a PostgreSQL
+        delivery_tag: tag del mensaje procesado
+    """
+    global _pending_acks, _last_delivery_tag
+    _last_delivery_tag = delivery_tag
+    _pending_acks += 1
+    if _pending_acks >= ACK_BATCH:
+        flush_acks(ch, db_conn)
+
+def schedule_ack_flush(conn, ch, db_conn):
+    """
+    Programa un flush periódico (1s) para acotar la latencia del lote.
+
+    Args:
+        conn: conexión de RabbitMQ (BlockingConnection)
+        ch: canal de RabbitMQ
+        db_conn: conexión a PostgreSQL
+    """
+    def _tick():
+        global _messages_ok, _messages_invalid
+        if ch.is_open:
+            flush_acks(ch, db_conn)
+            if _messages_ok or _messages_invalid:
+                logger.info(f"Último segundo: {_messages_ok} ok, "
+                            f"{_messages_invalid} inválidos")
+                _messages_ok = 0
+                _messages_invalid = 0
+            conn.call_later(1.0, _tick)
+    conn.call_later(1.0, _tick)
+
 # ==================== Validación de datos ====================
-def validate_payload(payload):
+# Extrae los campos obligatorios en un solo acceso al dict;
+# si falta alguno, el KeyError indica cuál (camino feliz sin excepciones)
+_required_fields = itemgetter('station_id', 'temperature_c', 'humidity_percent')
+
+_NUM = (int, float)
+
+def validate_payload(payload, _num=_NUM, _get=dict.get, _type=type, _isfinite=isfinite):
     """
     Valida que los datos meteorológicos sean realistas.
-    
+
+    Una sola pasada sobre el payload con los builtins ligados a locales:
+    esta función corre por cada mensaje, así que cada lookup cuenta.
+    type(x) in _NUM evita el walk del MRO de isinstance, y la comparación
+    encadenada de rango es un solo salto de bytecode que además descarta
+    NaN/Inf (toda comparación con NaN es falsa), que pasarían el chequeo
+    de tipo pero reventarían en BD.
+
     Args:
         payload: dict con datos
-        
+
     Retorna: tupla (es_valido, estado, motivo)
     """
-    # Validar campos obligatorios
-    if 'station_id' not in payload:
-        return False, 'invalid', 'falta station_id'
-    
-    if 'temperature_c' not in payload:
-        return False, 'invalid', 'falta temperature_c'
-    
-    if 'humidity_percent' not in payload:
-        return False, 'invalid', 'falta humidity_percent'
-    
+    # Campos obligatorios, en un solo acceso. TypeError cubre JSON válido
+    # que no es un objeto ([1,2], "x", 42): itemgetter no levanta KeyError
+    # sobre esos tipos.
+    try:
+        _station, temp, humidity = _required_fields(payload)
+    except KeyError as e:
+        return False, 'invalid', f'falta {e.args[0]}'
+    except TypeError:
+        return False, 'invalid', 'payload no es un objeto JSON'
+
     # Validar rangos realistas
-    temp = payload.get('temperature_c')
-    if not isinstance(temp, (int, float)):
+    if _type(temp) not in _num:
         return False, 'invalid_type', 'temperatura no es numérica'
-    
-    if temp < -100 or temp > 100:
+
+    if not -100.0 <= temp <= 100.0:
         return False, 'out_of_range', f'temperatura {temp}°C fuera de rango [-100, 100]'
-    
+
     # Validar humedad
-    humidity = payload.get('humidity_percent')
-    if not isinstance(humidity, (int, float)):
+    if _type(humidity) not in _num:
         return False, 'invalid_type', 'humedad no es numérica'
-    
-    if humidity < 0 or humidity > 100:
+
+    if not 0.0 <= humidity <= 100.0:
         return False, 'out_of_range', f'humedad {humidity}% debe estar [0, 100]'
-    
-    # Validar viento (opcional, pero si existe debe ser >= 0)
-    wind = payload.get('wind_speed_ms')
+
+    # Validar viento (opcional, pero si existe debe ser >= 0 y finito;
+    # aquí el isfinite es imprescindible: NaN también pasaría "no < 0")
+    wind = _get(payload, 'wind_speed_ms')
     if wind is not None:
-        if not isinstance(wind, (int, float)):
+        if _type(wind) not in _num:
             return False, 'invalid_type', 'viento no es numérico'
-        if wind < 0:
+        if not _isfinite(wind) or wind < 0:
             return False, 'out_of_range', f'viento {wind} m/s no puede ser negativo'
-    
+
     # Si llega aquí, es válido
     return True, 'ok', ''
 
 # ==================== Insertar en BD ====================
-def insert_into_db(db_conn, payload, status, error_reason=''):
+# Filas pendientes de volcar a PostgreSQL (se insertan en lote)
+pending_rows = []
+
+# Cursor reutilizado durante toda la vida de la conexión (ver connect_db)
+_cursor = None
+
+def _default_ts():
     """
-    Inserta un registro de meteorología en PostgreSQL.
-    
+    Timestamp UTC en formato ISO. Solo se calcula cuando el payload
+    no trae el suyo, que es el caso raro.
+    """
+    return datetime.now(timezone.utc).isoformat()
+
+def _flush_rows_copy(db_conn):
+    """
+    Vuelca las filas pendientes con COPY FROM STDIN (modo COPY_MODE=1).
+    El escapado del formato COPY lo hace psycopg (write_row).
+
+    Args:
+        db_conn: conexión a PostgreSQL
+    """
+    with _cursor.copy(COPY_SQL) as copy:
+        for row in pending_rows:
+            copy.write_row(row)
+    db_conn.commit()
+
+def _do_flush(db_conn):
+    """
+    Ejecuta el volcado del lote (COPY si COPY_MODE=1, si no executemany
+    en pipeline) y hace commit. Deja las excepciones subir al llamante.
+
+    Args:
+        db_conn: conexión a PostgreSQL
+    """
+    if COPY_MODE:
+        _flush_rows_copy(db_conn)
+        return
+    # En modo pipeline las N sentencias viajan sin esperar el resultado
+    # de cada una; los resultados se recogen en bloque al salir
+    with db_conn.pipeline():
+        _cursor.executemany(INSERT_SQL, pending_rows)
+    db_conn.commit()
+
+def flush_rows(db_conn):
+    """
+    Vuelca las filas pendientes a PostgreSQL en una sola sentencia.
+    N filas = un solo round-trip + un solo commit, en vez de uno por mensaje.
+
+    Args:
+        db_conn: conexión a PostgreSQL
+
+    Retorna: True si el lote se insertó correctamente
+    """
+    if not pending_rows:
+        return True
+    try:
+        _do_flush(db_conn)
+        logger.info(f"✓ Lote guardado: {len(pending_rows)} filas")
+        pending_rows.clear()
+        return True
+    except (psycopg.InterfaceError, psycopg.OperationalError) as e:
+        # Conexión caída: las filas se conservan para poder reintentar el
+        # flush si la recuperación barata funciona; solo se descartan
+        # cuando los mensajes van a volver redelivered (NACK o reconexión),
+        # para no duplicarlos.
+        logger.error(f"✗ Conexión a BD caída durante el flush: {e}")
+        if not recover_db_conn(db_conn):
+            # Las filas se conservan: quien capture esto debe NACKear la
+            # ventana con requeue (requeue_pending_window) antes de que se
+            # pueda volver a flushear, para no confirmar nada sin commit
+            raise
+        try:
+            _do_flush(db_conn)
+            logger.info(f"✓ Lote guardado (tras recuperar): {len(pending_rows)} filas")
+            pending_rows.clear()
+            return True
+        except Exception as e2:
+            logger.error(f"✗ Reintento del flush falló: {e2}")
+            pending_rows.clear()
+            return False
+    except Exception as e:
+        # Una fila envenenada no debe tirar el lote entero: rollback y
+        # rescate fila a fila, descartando solo las que fallen de verdad
+        logger.error(f"✗ Error insertando lote en BD: {e}")
+        db_conn.rollback()
+        try:
+            return _flush_rows_single(db_conn)
+        except Exception as e2:
+            logger.error(f"✗ Rescate fila a fila falló: {e2}")
+            pending_rows.clear()
+            return False
+
+def _flush_rows_single(db_conn):
+    """
+    Camino de rescate cuando el lote falla: reintenta las filas una a una
+    para que una fila envenenada no arrastre a las demás. Las filas que
+    fallan individualmente se descartan (como en el camino sin lotes).
+
+    Args:
+        db_conn: conexión a PostgreSQL
+
+    Retorna: True (el lote queda resuelto, con las filas malas descartadas)
+    """
+    saved = 0
+    total = len(pending_rows)
+    for row in pending_rows:
+        try:
+            _cursor.execute(INSERT_SQL, row)
+            db_conn.commit()
+            saved += 1
+        except Exception as e:
+            db_conn.rollback()
+            logger.error(f"✗ Fila descartada ({row[0]}): {e}")
+    logger.info(f"✓ Rescate del lote: {saved}/{total} filas guardadas")
+    pending_rows.clear()
+    return True
+
+def insert_into_db(db_conn, payload, body, status, error_reason=''):
+    """
+    Encola un registro de meteorología para inserción en lote.
+    El lote se vuelca al llenarse (INSERT_BATCH) o en el flush periódico.
+
     Args:
         db_conn: conexión a PostgreSQL
         payload: dict con datos
+        body: bytes JSON originales del mensaje (van tal cual a raw_payload;
+              el servidor los parsea a jsonb, sin re-serializar en Python)
         status: estado del registro ('ok', 'invalid', 'out_of_range')
         error_reason: razón del error si aplica
     """
+    # Preparar valores (bind local de payload.get: más rápido que el
+    # lookup de atributo repetido, y el timestamp por defecto solo se
+    # calcula si el payload no trae uno)
+    get = payload.get
+    station_id = get('station_id')
+    timestamp = get('timestamp') or _default_ts()
+    temperature = get('temperature_c')
+    humidity = get('humidity_percent')
+    wind = get('wind_speed_ms')
+
+    # Determinar estado final
+    final_status = status if status == 'ok' else error_reason
+
+    row = (
+        station_id,
+        timestamp,
+        temperature,
+        humidity,
+        wind,
+        body.decode(),
+        final_status
+    )
+
+    if INSERT_BATCH <= 1:
+        # Modo sin lote: psycopg3 prepara la sentencia en el servidor tras
+        # unas pocas ejecuciones, ahorrando el parse+plan por fila.
+        try:
+            _cursor.execute(INSERT_SQL, row)
+            db_conn.commit()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"✓ Guardado: {station_id} | Temp: {temperature}°C | Status: {final_status}")
+            return True
+        except (psycopg.InterfaceError, psycopg.OperationalError) as e:
+            logger.error(f"✗ Conexión a BD caída: {e}")
+            if not recover_db_conn(db_conn):
+                raise
+            return False
+        except Exception as e:
+            logger.error(f"✗ Error insertando en BD: {e}")
+            db_conn.rollback()
+            return False
+
+    pending_rows.append(row)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"→ Encolado: {station_id} | Temp: {temperature}°C | Status: {final_status}")
+
+    if len(pending_rows) >= INSERT_BATCH:
+        return flush_rows(db_conn)
+    return True
+
+# ==================== Pool multihilo (opcional) ====================
+# Pool de conexiones + executor para el modo DB_WORKERS > 0
+_pg_pool = None
+_executor = None
+
+def init_worker_pool():
+    """
+    Crea el pool de conexiones a PostgreSQL y el executor de workers.
+    Solo se usa cuando DB_WORKERS > 0.
+    """
+    global _pg_pool, _executor
+    _pg_pool = ConnectionPool(
+        min_size=1,
+        max_size=DB_WORKERS,
+        kwargs={
+            "host": _pg_host(),
+            "dbname": PG_DB,
+            "user": PG_USER,
+            "password": PG_PASS,
+            "sslmode": PG_SSLMODE,
+            "connect_timeout": 5,
+        },
+    )
+    _executor = ThreadPoolExecutor(max_workers=DB_WORKERS)
+    logger.info(f"✓ Pool PostgreSQL multihilo creado ({DB_WORKERS} workers)")
+
+def _insert_and_ack(ch, delivery_tag, payload, body, status, error_reason):
+    """
+    Camino multihilo: toma una conexión del pool, inserta la fila y
+    programa el ACK de vuelta en el hilo de I/O de pika (obligatorio:
+    los canales de pika no son thread-safe).
+
+    Args:
+        ch: canal de RabbitMQ
+        delivery_tag: tag del mensaje
+        payload: dict con datos
+        body: bytes JSON originales del mensaje
+        status: estado del registro
+        error_reason: razón del error si aplica
+    """
+    get = payload.get
+    final_status = status if status == 'ok' else error_reason
     try:
-        cur = db_conn.cursor()
-        
-        # Preparar valores
-        station_id = payload.get('station_id')
-        timestamp = payload.get('timestamp', datetime.now(timezone.utc).isoformat())
-        temperature = payload.get('temperature_c')
-        humidity = payload.get('humidity_percent')
-        wind = payload.get('wind_speed_ms')
-        
-        # Determinar estado final
-        final_status = status if status == 'ok' else error_reason
-        
-        # Insertar
-        cur.execute(
-            """
-            INSERT INTO weather_logs 
-            (station_id, timestamp, temperature_c, humidity_percent, wind_speed_ms, raw_payload, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                station_id,
-                timestamp,
-                temperature,
-                humidity,
-                wind,
-                Json(payload),
-                final_status
+        # El context manager del pool devuelve la conexión y hace
+        # commit (o rollback si hay excepción) al salir
+        with _pg_pool.connection() as conn:
+            conn.execute(
+                INSERT_SQL,
+                (
+                    get('station_id'),
+                    get('timestamp') or _default_ts(),
+                    get('temperature_c'),
+                    get('humidity_percent'),
+                    get('wind_speed_ms'),
+                    body.decode(),
+                    final_status
+                )
             )
-        )
-        
-        cur.close()
-        logger.info(f"✓ Guardado: {station_id} | Temp: {temperature}°C | Status: {final_status}")
-        return True
-        
     except Exception as e:
-        logger.error(f"✗ Error insertando en BD: {e}")
-        return False
+        logger.error(f"✗ Error insertando en BD (worker): {e}")
+
+    ch.connection.add_callback_threadsafe(
+        lambda: ch.basic_ack(delivery_tag=delivery_tag)
+    )
 
 # ==================== Callback de mensaje ====================
+# Contadores agregados: se loguean una vez por segundo en el tick periódico
+# en lugar de una línea por mensaje
+_messages_ok = 0
+_messages_invalid = 0
+
 def on_message_received(ch, method, properties, body, db_conn):
     """
     Callback ejecutado cada vez que llega un mensaje de RabbitMQ.
@@ -224,37 +663,73 @@ def on_message_received(ch, method, properties, body, db_conn):
         body: contenido del mensaje (JSON)
         db_conn: conexión a PostgreSQL
     """
-    logger.info(f"\n← Mensaje recibido (delivery_tag: {method.delivery_tag})")
-    
+    global _messages_ok, _messages_invalid
+
+    # Las líneas por mensaje van a DEBUG: formatear un dict de ~200 chars y
+    # escribirlo a stderr en cada mensaje es CPU + syscalls medibles a ritmo
+    # alto. El guard evita incluso el coste del f-string si DEBUG está apagado.
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        logger.debug(f"← Mensaje recibido (delivery_tag: {method.delivery_tag})")
+
     try:
-        # Parsear JSON
-        payload = json.loads(body)
-        logger.info(f"  Datos: {payload}")
-        
+        # Parsear JSON (simdjson u orjson si están disponibles)
+        payload = _parse(body)
+        if debug:
+            logger.debug(f"  Datos: {payload}")
+
         # Validar
         is_valid, status, reason = validate_payload(payload)
-        
-        if not is_valid:
-            logger.warning(f"  ⚠ Validación falló: {reason}")
+
+        if is_valid:
+            _messages_ok += 1
         else:
-            logger.info(f"  ✓ Validación OK")
-        
+            _messages_invalid += 1
+            if debug:
+                logger.debug(f"  ⚠ Validación falló: {reason}")
+
         # Guardar en BD (incluso si es inválido, para auditoría)
-        insert_into_db(db_conn, payload, status, reason)
-        
-        # RECONOCER MENSAJE (ACK)
+        if _executor is not None:
+            # Modo multihilo: el worker inserta y programa el ACK él mismo
+            _executor.submit(_insert_and_ack, ch, method.delivery_tag,
+                             payload, body, status, reason)
+            return
+
+        insert_into_db(db_conn, payload, body, status, reason)
+
+        # RECONOCER MENSAJE (ACK en lote)
         # Si no hacemos ACK, el mensaje se devolverá a la cola
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        logger.info(f"  ✓ ACK enviado (mensaje procesado)")
-        
-    except json.JSONDecodeError as e:
+        ack_message(ch, db_conn, method.delivery_tag)
+        if debug:
+            logger.debug(f"  ✓ ACK registrado (se enviará en lote)")
+
+    except ValueError as e:
+        # JSONDecodeError (json/orjson) y los errores de simdjson
+        # son subclases de ValueError
         logger.error(f"  ✗ JSON inválido: {e}")
         # ACK aun así para no atascar la cola
-        ch.basic_ack(delivery_tag=method.delivery_tag)
-        
+        if _executor is not None:
+            # En modo multihilo cada worker confirma su tag individualmente;
+            # un ACK en lote (multiple=True) desde aquí cubriría tags de
+            # inserts aún en vuelo y el ACK posterior del worker cerraría
+            # el canal con 406 PRECONDITION_FAILED (tag desconocido)
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+        else:
+            ack_message(ch, db_conn, method.delivery_tag)
+
+    except (psycopg.InterfaceError, psycopg.OperationalError) as e:
+        # BD irrecuperable: NACK con requeue de toda la ventana pendiente
+        # (sus filas nunca llegaron a commitearse) y re-raise para que
+        # main() rehaga las conexiones; el broker redelivera los mensajes.
+        logger.error(f"  ✗ BD no disponible: {e}")
+        requeue_pending_window(ch, method.delivery_tag)
+        raise
+
     except Exception as e:
         logger.error(f"  ✗ Error procesando mensaje: {e}")
-        # NACK sin requeue: envía a Dead Letter Queue o descarta
+        # Primero confirmamos los mensajes buenos anteriores para que el
+        # NACK no los arrastre; luego NACK individual sin requeue.
+        flush_acks(ch, db_conn)
         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
         logger.info(f"  ! NACK sin requeue enviado (mensaje descartado)")
 
@@ -276,18 +751,33 @@ def main():
         try:
             # Conectar a BD
             db_conn = connect_db()
-            
+
+            # Pool multihilo opcional (DB_WORKERS > 0)
+            if DB_WORKERS > 0 and _executor is None:
+                init_worker_pool()
+
             # Conectar a RabbitMQ
             rabbit_conn, ch = connect_rabbitmq()
-            
+
+            # La ventana de ACKs es por canal: descartar cualquier estado
+            # heredado de un canal anterior antes de empezar a consumir
+            reset_ack_state()
+
             # Registrar callback para mensajes
             # auto_ack=False permite ACK manual
+            # partial en vez de lambda: un frame de Python menos por entrega
             ch.basic_consume(
                 queue=QUEUE,
-                on_message_callback=lambda ch, m, p, b: on_message_received(ch, m, p, b, db_conn),
+                on_message_callback=partial(on_message_received, db_conn=db_conn),
                 auto_ack=False
             )
             
+            # Flush periódico de filas y ACKs para acotar la latencia del lote
+            schedule_ack_flush(rabbit_conn, ch, db_conn)
+
+            # Ping periódico a BD para cazar conexiones muertas a tiempo
+            schedule_db_ping(rabbit_conn, db_conn)
+
             logger.info("✓ Escuchando mensajes...")
             logger.info("  Presiona Ctrl+C para detener\n")
             
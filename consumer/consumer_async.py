@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+"""
+Consumer asíncrono de datos meteorológicos (variante opcional).
+Misma semántica que consumer.py, pero sobre aio-pika + asyncpg: mientras un
+INSERT está en vuelo hacia PostgreSQL, el event loop sigue recibiendo
+mensajes del broker, así que la I/O de RabbitMQ y la de BD se solapan.
+
+Para usarlo, cambia el CMD del contenedor a: python consumer_async.py
+"""
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timezone
+
+import aio_pika
+import asyncpg
+
+# orjson parsea ~3x más rápido que la librería estándar y acepta bytes
+# directamente (sin .decode()). Si no está instalado, caemos a json.
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+# ==================== Configuración ====================
+RABBIT_HOST = os.getenv("RABBITMQ_HOST", "localhost")
+RABBIT_USER = os.getenv("RABBITMQ_USER", "rabbit")
+RABBIT_PASS = os.getenv("RABBITMQ_PASS", "rabbitpass")
+
+PG_HOST = os.getenv("POSTGRES_HOST", "localhost")
+PG_DB = os.getenv("POSTGRES_DB", "weatherdb")
+PG_USER = os.getenv("POSTGRES_USER", "weather")
+PG_PASS = os.getenv("POSTGRES_PASSWORD", "weatherpass")
+
+EXCHANGE = "weather_exchange"
+QUEUE = "weather_queue"
+ROUTING_KEY = "weather.logs"
+
+PREFETCH = int(os.getenv("PREFETCH_COUNT", "100"))
+
+# Pool de conexiones a PostgreSQL: varias inserciones en vuelo a la vez
+POOL_MIN = int(os.getenv("PG_POOL_MIN", "4"))
+POOL_MAX = int(os.getenv("PG_POOL_MAX", "8"))
+
+# Configurar logging ANTES de importar consumer: su basicConfig a nivel de
+# módulo ganaría la carrera y todas las líneas saldrían como [CONSUMER]
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - [CONSUMER-ASYNC] - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Reutilizamos la validación del consumer síncrono: misma lógica, un solo sitio
+from consumer import validate_payload
+
+INSERT_SQL = """
+    INSERT INTO weather_logs
+    (station_id, timestamp, temperature_c, humidity_percent, wind_speed_ms, raw_payload, status)
+    VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7)
+"""
+
+# ==================== Procesar mensaje ====================
+def _parse_ts(value):
+    """
+    Convierte el timestamp ISO del payload a datetime; si falta o es
+    inválido, usa la hora actual en UTC.
+    """
+    if value:
+        try:
+            return datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            pass
+    return datetime.now(timezone.utc)
+
+async def handle_message(pool, message):
+    """
+    Valida e inserta un mensaje. Corre como task independiente, así que
+    varios mensajes pueden estar insertando en paralelo contra el pool.
+
+    Args:
+        pool: pool de conexiones asyncpg
+        message: mensaje entrante de aio-pika
+    """
+    # process(): ACK al salir sin excepción, NACK sin requeue si explota.
+    # ignore_processed permite el reject manual con requeue de abajo.
+    async with message.process(requeue=False, ignore_processed=True):
+        try:
+            payload = _loads(message.body)
+        except (json.JSONDecodeError, ValueError) as e:
+            # ACK aun así para no atascar la cola
+            logger.error(f"✗ JSON inválido: {e}")
+            return
+
+        is_valid, status, reason = validate_payload(payload)
+        if not is_valid:
+            logger.warning(f"⚠ Validación falló: {reason}")
+
+        final_status = status if status == 'ok' else reason
+        get = payload.get
+
+        # Guardar en BD (incluso si es inválido, para auditoría)
+        try:
+            await pool.execute(
+                INSERT_SQL,
+                get('station_id'),
+                _parse_ts(get('timestamp')),
+                get('temperature_c'),
+                get('humidity_percent'),
+                get('wind_speed_ms'),
+                message.body.decode(),
+                final_status
+            )
+        except (asyncpg.PostgresConnectionError, asyncpg.InterfaceError,
+                OSError, asyncio.TimeoutError) as e:
+            # BD caída o conexión del pool rota: devolver el mensaje a la
+            # cola para reintento. El NACK sin requeue del process() queda
+            # reservado para mensajes envenenados; descartar durante un
+            # corte de BD vaciaría la cola entera sin guardar nada.
+            logger.error(f"✗ BD no disponible, mensaje reencolado: {e}")
+            await message.reject(requeue=True)
+
+# ==================== Loop principal ====================
+async def run():
+    """
+    Conecta a PostgreSQL y RabbitMQ y consume mensajes indefinidamente.
+    """
+    logger.info("========== INICIANDO CONSUMER ASYNC ==========")
+    logger.info(f"RabbitMQ Host: {RABBIT_HOST}")
+    logger.info(f"PostgreSQL Host: {PG_HOST}")
+    logger.info(f"Queue: {QUEUE} | Prefetch: {PREFETCH} | Pool: {POOL_MIN}-{POOL_MAX}")
+    logger.info("==============================================")
+
+    pool = await asyncpg.create_pool(
+        host=PG_HOST,
+        database=PG_DB,
+        user=PG_USER,
+        password=PG_PASS,
+        min_size=POOL_MIN,
+        max_size=POOL_MAX
+    )
+    logger.info("✓ Pool de PostgreSQL creado")
+
+    # connect_robust reintenta y reconecta solo ante caídas del broker
+    connection = await aio_pika.connect_robust(
+        host=RABBIT_HOST,
+        login=RABBIT_USER,
+        password=RABBIT_PASS
+    )
+    logger.info("✓ Conectado a RabbitMQ")
+
+    async with connection:
+        channel = await connection.channel()
+        await channel.set_qos(prefetch_count=PREFETCH)
+
+        exchange = await channel.declare_exchange(
+            EXCHANGE, aio_pika.ExchangeType.DIRECT, durable=True
+        )
+        queue = await channel.declare_queue(QUEUE, durable=True)
+        await queue.bind(exchange, ROUTING_KEY)
+
+        logger.info("✓ Escuchando mensajes...")
+
+        # El event loop solo guarda referencias débiles a las tasks: sin una
+        # referencia fuerte, una task en vuelo puede ser recolectada a mitad
+        # de insert. El done-callback también recoge la excepción para que
+        # no se pierda como "Task exception was never retrieved".
+        in_flight = set()
+
+        def _task_done(task):
+            in_flight.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                logger.error(f"✗ Error procesando mensaje: {task.exception()}")
+
+        async with queue.iterator() as messages:
+            async for message in messages:
+                # Task por mensaje: el insert y el fetch del siguiente
+                # mensaje se solapan en el event loop
+                task = asyncio.create_task(handle_message(pool, message))
+                in_flight.add(task)
+                task.add_done_callback(_task_done)
+
+def main():
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        logger.info("\n✓ Consumer detenido por usuario (Ctrl+C)")
+
+if __name__ == "__main__":
+    main()
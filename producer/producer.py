@@ -10,10 +10,20 @@ import json
 import random
 import logging
 import uuid
+import itertools
 from datetime import datetime, timezone
 import pika
 from pika.exceptions import AMQPConnectionError, AMQPChannelError
 
+# orjson serializa ~3x más rápido y devuelve bytes, que basic_publish
+# acepta directamente. Si no está instalado, caemos a json.
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj).encode()
+
 # ==================== Configuración ====================
 RABBIT_HOST = os.getenv("RABBITMQ_HOST", "localhost")
 RABBIT_USER = os.getenv("RABBITMQ_USER", "rabbit")
@@ -22,6 +32,34 @@ RABBIT_PASS = os.getenv("RABBITMQ_PASS", "rabbitpass")
 EXCHANGE = "weather_exchange"
 ROUTING_KEY = "weather.logs"
 
+# Cuántos mensajes se publican por ráfaga, y pausa entre ráfagas
+# (0 para pruebas de carga).
+PUBLISH_BATCH = int(os.getenv("PUBLISH_BATCH", "1"))
+SLEEP_SECONDS = float(os.getenv("SLEEP_SECONDS", "2"))
+
+# Cómo se confirma cada ráfaga con el broker:
+#   "tx"      (por defecto) transacción AMQP: un único punto de sincronía
+#             (tx_commit) confirma la ráfaga entera
+#   "per_msg" publisher confirms de pika: cada basic_publish bloquea
+#             esperando su propio confirm (máxima granularidad, un RTT
+#             de broker por mensaje)
+#   "off"     publicar a ciegas, sin confirmación
+PUBLISH_CONFIRMS = os.getenv("PUBLISH_CONFIRMS", "tx")
+
+# message_id: contador monótono con arranque (ns) y PID delante. Único
+# entre reinicios y procesos, y 10-20x más barato que uuid4 (que lee
+# /dev/urandom y formatea 122 bits por mensaje). STRICT_UUID=1 recupera
+# UUIDs RFC 4122 si alguna integración los exige.
+STRICT_UUID = os.getenv("STRICT_UUID", "0") == "1"
+_ID_PREFIX = f"{time.time_ns()}-{os.getpid()}"
+_SEQ = itertools.count()
+
+def next_message_id():
+    """Genera el message_id del siguiente mensaje."""
+    if STRICT_UUID:
+        return str(uuid.uuid4())
+    return f"{_ID_PREFIX}-{next(_SEQ)}"
+
 # Configurar logging
 logging.basicConfig(
     level=logging.INFO,
@@ -83,11 +121,11 @@ def publish_message(ch, payload):
         ch.basic_publish(
             exchange=EXCHANGE,
             routing_key=ROUTING_KEY,
-            body=json.dumps(payload),
+            body=_dumps(payload),
             properties=pika.BasicProperties(
                 delivery_mode=2,  # Persistente: se guardan en disco
                 content_type='application/json',
-                message_id=str(uuid.uuid4()),  # ID único para cada mensaje
+                message_id=next_message_id(),  # ID único para cada mensaje
                 timestamp=int(time.time() * 1000)
             )
         )
@@ -96,32 +134,56 @@ def publish_message(ch, payload):
         logger.error(f"Error publicando mensaje: {e}")
 
 # ==================== Generar datos simulados ====================
+# Binds a nivel de módulo: el generador corre una vez por mensaje y el
+# lookup global de random.uniform/round en cada iteración es coste puro
+_uniform = random.uniform
+_randint = random.randint
+_round = round
+
+# Cache del timestamp ISO, refrescado como mucho una vez por segundo
+# (precisión de segundos sobra para datos simulados)
+_ts_second = 0
+_ts_iso = ''
+
+def _iso_now():
+    """Timestamp UTC en ISO, cacheado por segundo."""
+    global _ts_second, _ts_iso
+    second = int(time.time())
+    if second != _ts_second:
+        _ts_second = second
+        _ts_iso = datetime.fromtimestamp(second, timezone.utc).isoformat()
+    return _ts_iso
+
+# Dict reutilizado entre iteraciones: publish_message lo serializa antes
+# de que generate_weather_data vuelva a mutarlo, así que es seguro
+_payload = {
+    "station_id": "",
+    "timestamp": "",
+    "temperature_c": 0.0,
+    "humidity_percent": 0.0,
+    "wind_speed_ms": 0.0
+}
+
 def generate_weather_data():
     """
     Genera datos meteorológicos simulados realistas.
-    
+
     Retorna: dict con estación, temperatura, humedad, viento
     """
-    station_id = f"station_{random.randint(1, 5)}"
-    
+    p = _payload
+    p["station_id"] = f"station_{_randint(1, 5)}"
+    p["timestamp"] = _iso_now()
+
     # Temperaturas realistas según región
-    temperature_c = round(random.uniform(-10, 40), 2)
-    
+    p["temperature_c"] = _round(_uniform(-10, 40), 2)
+
     # Humedad entre 0 y 100%
-    humidity_percent = round(random.uniform(20, 95), 2)
-    
+    p["humidity_percent"] = _round(_uniform(20, 95), 2)
+
     # Velocidad del viento realista (m/s)
-    wind_speed_ms = round(random.uniform(0, 25), 3)
-    
-    payload = {
-        "station_id": station_id,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "temperature_c": temperature_c,
-        "humidity_percent": humidity_percent,
-        "wind_speed_ms": wind_speed_ms
-    }
-    
-    return payload
+    p["wind_speed_ms"] = _round(_uniform(0, 25), 3)
+
+    return p
 
 # ==================== Loop principal ====================
 def main():
@@ -145,22 +207,41 @@ def main():
             
             # Declarar exchange persistente
             declare_exchange(ch)
-            
+
+            # Confirmación de ráfagas: transacción AMQP por defecto (un solo
+            # round-trip de tx_commit confirma PUBLISH_BATCH mensajes). En
+            # "per_msg", confirm_delivery() hace que cada basic_publish de
+            # un BlockingChannel bloquee esperando su propio confirm.
+            if PUBLISH_CONFIRMS == "tx":
+                ch.tx_select()
+                logger.info("✓ Transacciones AMQP activadas (un commit por ráfaga)")
+            elif PUBLISH_CONFIRMS == "per_msg":
+                ch.confirm_delivery()
+                logger.info("✓ Publisher confirms activados (confirm por mensaje)")
+
             # Loop de publicación de mensajes
             message_count = 0
             while True:
                 try:
-                    # Generar datos
-                    payload = generate_weather_data()
-                    
-                    # Publicar
-                    publish_message(ch, payload)
-                    
-                    message_count += 1
-                    
-                    # Pausa entre mensajes (ajusta según necesidad)
-                    time.sleep(2)
-                    
+                    # Publicar una ráfaga y confirmarla de una vez
+                    for _ in range(PUBLISH_BATCH):
+                        payload = generate_weather_data()
+                        publish_message(ch, payload)
+                        message_count += 1
+
+                    if PUBLISH_CONFIRMS == "tx":
+                        # Único punto de sincronía de la ráfaga: el broker
+                        # persiste y confirma los N publishes juntos
+                        ch.tx_commit()
+
+                    # Dar servicio al event loop de pika entre ráfagas
+                    # (heartbeats, frames pendientes), sin bloquear
+                    conn.process_data_events(time_limit=0)
+
+                    # Pausa entre ráfagas (ajusta según necesidad)
+                    if SLEEP_SECONDS > 0:
+                        time.sleep(SLEEP_SECONDS)
+
                 except KeyboardInterrupt:
                     logger.info("\n✓ Producer detenido por usuario (Ctrl+C)")
                     break